@@ -47,14 +47,17 @@ from common import (
 from rich.markup import escape
 from m_redeem import maybe_handle_manual_redeem
 from redeem_logic import (
+    RETRYABLE_FAILURE_LABELS,
     RedemptionCandidate,
     RedemptionPlan,
     build_redemption_plan,
+    failure_label_for_status,
     format_status_detail,
     normalize_requested_platforms,
     normalize_shift_code,
+    reset_caches,
 )
-from shift import Status
+from shift import POSITIVE_STATUSES, Status
 
 # Static choices so CLI parsing doesn't need to import query/db
 STATIC_GAMES = ["bl4", "bl3", "blps", "bl2", "bl1", "ttw", "gdfll"]
@@ -86,7 +89,7 @@ def redeem(key: "Key"):
     detail = format_status_detail(status, key)
 
     # set redeemed status only for positive outcomes
-    if status in (Status.SUCCESS, Status.REDEEMED):
+    if status in POSITIVE_STATUSES:
         status_label = getattr(status, "name", "SUCCESS")
         query.db.set_redeemed(key, status_label, detail)
 
@@ -97,7 +100,7 @@ def redeem(key: "Key"):
 
     _L.info("  " + msg)
 
-    return status in (Status.SUCCESS, Status.REDEEMED)
+    return status in POSITIVE_STATUSES
 
 
 def _load_plan(plan_cache: dict[str, RedemptionPlan], code: str, bypass_fail: bool) -> RedemptionPlan:
@@ -113,46 +116,10 @@ def _load_plan(plan_cache: dict[str, RedemptionPlan], code: str, bypass_fail: bo
     return plan
 
 
-def _find_candidate(
-    plan: RedemptionPlan, game: str, platform: str
-) -> tuple[Optional[RedemptionCandidate], Optional[str]]:
-    for candidate in plan.attempts:
-        if candidate.game == game and candidate.platform == platform:
-            return candidate, "attempt"
-    for candidate in plan.skipped:
-        if candidate.game == game and candidate.platform == platform:
-            return candidate, "skip"
-    return None, None
-
-
 def _format_pair(code: str, candidate: RedemptionCandidate) -> str:
     return f"{code} -> {candidate.platform}:{candidate.game}"
 
 
-def _failure_label_for_status(status: Status) -> str:
-    if status == Status.EXPIRED:
-        return "EXPIRED"
-    if status == Status.INVALID:
-        return "INVALID"
-    if status == Status.SLOWDOWN:
-        return "RATELIMIT"
-    if status == Status.TRYLATER:
-        return "TRYLATER"
-    if status == Status.REDIRECT:
-        return "NETWORK_ERROR"
-    if status in (Status.NONE, Status.UNKNOWN):
-        return "UNKNOWN_ERROR"
-    return getattr(status, "name", "UNKNOWN_ERROR")
-
-
-def _key_for_candidate(candidate: RedemptionCandidate) -> Key:
-    return candidate.key.copy().set(
-        platform=candidate.platform,
-        game=candidate.game,
-        code=candidate.code,
-    )
-
-
 def _log_auto_skip(
     code: str, candidate: RedemptionCandidate, _bypass_fail: bool
 ) -> Optional[tuple[str, str]]:
@@ -535,6 +502,10 @@ def main(args):
     if shift_src:
         query.set_shift_source(shift_src)
 
+    # DEV NOTE: The parsed SHiFT source is memoized for the duration of a run; scheduled
+    #           runs must start from a fresh pull.
+    reset_caches()
+
     if not getattr(args, "redeem", None):
         _L.error(
             "--redeem is now required. Legacy --games/--platforms mode is disabled because --redeem provides the improved logging pipeline."
@@ -960,7 +931,7 @@ def main(args):
                     normalized_code = normalize_shift_code(key.code) or key.code
                     pair_id = (normalized_code, game, platform)
                     plan = _load_plan(plan_cache, normalized_code, bypass_fail)
-                    candidate, disposition = _find_candidate(plan, game, platform)
+                    candidate, disposition = plan.lookup(game, platform)
                     if candidate is None:
                         _L.debug(
                             f"No candidate metadata for {normalized_code} on {platform}:{game}; skipping."
@@ -982,7 +953,7 @@ def main(args):
                             candidate.skip_reason == "expired"
                             and candidate.should_record_preclassification
                         ):
-                            attempt_key = _key_for_candidate(candidate)
+                            attempt_key = candidate.attempt_key()
                             query.db.record_failure(
                                 attempt_key,
                                 candidate.platform,
@@ -992,7 +963,7 @@ def main(args):
                             candidate.should_record_preclassification = False
 
                         if candidate.skip_reason == "redeemed":
-                            counted_key = _key_for_candidate(candidate)
+                            counted_key = candidate.attempt_key()
                             if _is_key_reward(counted_key):
                                 if _is_golden(counted_key):
                                     ignored_redeemed_g += 1
@@ -1018,9 +989,9 @@ def main(args):
                         continue
                     if pair_id in processed_pairs:
                         continue
-                    attempt_key = _key_for_candidate(candidate)
+                    attempt_key = candidate.attempt_key()
                     previous_status = (candidate.previously_failed or "").upper()
-                    if previous_status in {"TRYLATER", "RATELIMIT", "NETWORK_ERROR"}:
+                    if previous_status in RETRYABLE_FAILURE_LABELS:
                         label = _format_pair(normalized_code, candidate)
                         _L.info(
                             f"\t{label}: retrying first because of Status: '{previous_status}' last run."
@@ -1098,7 +1069,7 @@ def main(args):
                             _L.info(f"No more {end_label} left!")
                             last_end_label = end_label
                     else:
-                        failure_label = _failure_label_for_status(status)
+                        failure_label = failure_label_for_status(status)
                         query.db.record_failure(
                             attempt_key,
                             candidate.platform,
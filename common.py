@@ -43,6 +43,9 @@ DIRNAME = path.dirname(FILEPATH)
 
 SLEEP_TIMER = int(os.getenv("SLEEP_TIMER", "60"))
 
+# dataclass(**DATACLASS_SLOTS): slot-backed instances where supported (3.10+)
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 # Profile support: set AUTOSHIFT_PROFILE env var to choose a profile (e.g. "work", "home")
 PROFILE = os.getenv(
     "AUTOSHIFT_PROFILE"
@@ -1,37 +1,62 @@
 """Manual single-code redeem helpers."""
 from __future__ import annotations
 
-import re
 import sys
+from collections import Counter, defaultdict
 from dataclasses import dataclass
 from time import sleep
 from typing import List, Optional, Sequence
 
-from common import _L, SLEEP_TIMER
+from common import _L, DATACLASS_SLOTS, DEBUG, SLEEP_TIMER
 import query
-from query import Key
-from shift import Status
+from shift import POSITIVE_STATUSES, Status
 from redeem_logic import (
+    RETRYABLE_FAILURE_LABELS,
     RedemptionCandidate,
     RedemptionPlan,
     build_redemption_plan,
+    failure_label_for_status,
     format_status_detail,
     normalize_requested_platforms,
     normalize_shift_code,
 )
 
-_STRIP_RE = re.compile(r"[^A-Z0-9]", re.IGNORECASE)
+# Statuses that change control flow in the redeem loop; anything else is a plain failure.
+_STATUS_ACTIONS = {
+    Status.SUCCESS: "success",
+    Status.REDEEMED: "success",
+    Status.SLOWDOWN: "slowdown",
+    Status.TRYLATER: "trylater",
+}
+
+# Mapping-mode options that manual --redeem rejects when set (attribute, CLI label).
+_DISALLOWED_FLAGS = (
+    ("golden", "--golden"),
+    ("non_golden", "--non-golden"),
+    ("other", "--other"),
+    ("_limit_was_supplied", "--limit"),
+    ("games", "--games"),
+    ("platforms", "--platforms"),
+)
+
+
+def _slowdown_delay(shift_client) -> float:
+    """Wait before retrying a SLOWDOWN: the server's Retry-After, capped at SLEEP_TIMER."""
+    retry_after = getattr(shift_client, "last_retry_after", None)
+    if retry_after is None:
+        return SLEEP_TIMER
+    return min(SLEEP_TIMER, max(1.0, retry_after))
 
 
 def _is_positive_status(status: Status) -> bool:
-    return status in (Status.SUCCESS, Status.REDEEMED)
+    return status in POSITIVE_STATUSES
 
 
 class ManualRedeemUsageError(Exception):
     """Raised when --redeem arguments cannot be handled in manual mode."""
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class ManualContext:
     original_code: str
     normalized_code: str
@@ -42,14 +67,22 @@ class ManualContext:
     verbose: bool
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class AttemptResult:
     candidate: RedemptionCandidate
     status: Status
     detail: str
 
 
+@dataclass(**DATACLASS_SLOTS)
+class RedeemOutcome:
+    results: List[AttemptResult]
+    hit_try_later: bool = False
+    any_success: bool = False
+
+
 def maybe_handle_manual_redeem(args, shift_client, redeem_cb) -> bool:
+    """Run a manual --redeem request; returns False when args hold none."""
     try:
         manual_request = _extract_manual_request(args)
     except ManualRedeemUsageError as exc:
@@ -62,38 +95,34 @@ def maybe_handle_manual_redeem(args, shift_client, redeem_cb) -> bool:
     normalized_code, platform_filter = manual_request
     verbose = bool(getattr(args, "verbose", False))
     bypass_fail = bool(getattr(args, "bypass_fail", False))
+    schedule = getattr(args, "schedule", None)
 
     try:
-        _ensure_manual_flags_allowed(args)
+        _ensure_manual_flags_allowed(args, schedule)
     except ManualRedeemUsageError as exc:
         _L.error(str(exc))
         sys.exit(2)
 
     context = _build_manual_context(
         normalized_code,
-        bool(getattr(args, "schedule", None)),
+        bool(schedule),
         platform_filter,
         bypass_fail,
         verbose,
     )
 
     _log_plan_intro(context)
-    _handle_skipped_candidates(context)
-
-    results, hit_try_later = _redeem_candidates(context, shift_client, redeem_cb)
+    previous_success = _handle_skipped_candidates(context)
 
-    previous_success = any(
-        candidate.skip_reason == "redeemed" for candidate in context.plan.skipped
-    )
-    run_success = any(_is_positive_status(result.status) for result in results)
-    any_success = previous_success or run_success
+    outcome = _redeem_candidates(context, shift_client, redeem_cb)
+    any_success = previous_success or outcome.any_success
 
-    _summarize_results(context, results, hit_try_later)
+    _summarize_results(context, outcome.results, outcome.hit_try_later)
 
     if context.scheduled:
         return True
 
-    if hit_try_later and not any_success:
+    if outcome.hit_try_later and not any_success:
         _L.warning(
             "Manual redeem ended early due to TRY LATER without any successful redemption."
         )
@@ -102,11 +131,10 @@ def maybe_handle_manual_redeem(args, shift_client, redeem_cb) -> bool:
 
 
 def _extract_manual_request(args) -> Optional[tuple[str, Optional[Sequence[str]]]]:
-    entries = [
-        entry.strip()
-        for entry in (getattr(args, "redeem", None) or [])
-        if entry and entry.strip()
-    ]
+    redeem = getattr(args, "redeem", None)
+    if not redeem:
+        return None
+    entries = [entry for entry in (raw.strip() for raw in redeem if raw) if entry]
     if not entries:
         return None
 
@@ -123,38 +151,28 @@ def _extract_manual_request(args) -> Optional[tuple[str, Optional[Sequence[str]]
     entry = entries[0]
     if ":" in entry:
         code_part, platform_part = entry.split(":", 1)
-        if not _looks_like_shift_code(code_part):
+        normalized = normalize_shift_code(code_part)
+        if not normalized:
             token = code_part.strip().lower()
-            if token in query.known_games or token in getattr(query.known_games, "inv", {}):
+            if token in query.known_games or token in query.known_games.inv:
                 return None
             raise ManualRedeemUsageError(
                 "Manual --redeem expects a SHiFT code followed by optional platforms (e.g. CODE-...:steam,epic)."
             )
-        normalized = normalize_shift_code(code_part)
-        if not normalized:
-            raise ManualRedeemUsageError(
-                "Manual --redeem requires a 25-character SHiFT code (5 blocks of 5 letters/numbers)."
-            )
         platform_filter = _normalize_manual_platforms(platform_part)
         return normalized, platform_filter
 
-    if not _looks_like_shift_code(entry):
-        raise ManualRedeemUsageError(
-            "Manual --redeem expects a SHiFT code in the format CODE-CODE-CODE-CODE-CODE (25 characters)."
-        )
-
     normalized = normalize_shift_code(entry)
     if not normalized:
         raise ManualRedeemUsageError(
-            "Manual --redeem requires a 25-character SHiFT code (5 blocks of 5 letters/numbers)."
+            "Manual --redeem expects a SHiFT code in the format CODE-CODE-CODE-CODE-CODE (25 characters)."
         )
 
     return normalized, None
 
 
 def _looks_like_shift_code(raw: str) -> bool:
-    stripped = _STRIP_RE.sub("", raw)
-    return len(stripped) == 25 and stripped.isalnum()
+    return normalize_shift_code(raw) is not None
 
 
 def _normalize_manual_platforms(raw: str) -> Sequence[str]:
@@ -180,9 +198,9 @@ def _normalize_platform_token(token: str) -> str:
     token_lower = token.strip().lower()
     if token_lower in query.known_platforms:
         return token_lower
-    inverted = getattr(query.known_platforms, "inv", {})
-    if token_lower in inverted:
-        return inverted[token_lower]
+    short = query.known_platforms.inv.get(token_lower)
+    if short is not None:
+        return short
     raise ManualRedeemUsageError(f"Unknown platform '{token}' for manual --redeem.")
 
 
@@ -193,12 +211,7 @@ def _build_manual_context(
     bypass_fail: bool,
     verbose: bool,
 ) -> ManualContext:
-    requested = (
-        normalize_requested_platforms(platform_filter)
-        if platform_filter
-        else normalize_requested_platforms(None)
-    )
-    plan = build_redemption_plan(code, requested, bypass_fail=bypass_fail)
+    plan = build_redemption_plan(code, platform_filter or (), bypass_fail=bypass_fail)
     stored_filter = tuple(platform_filter) if platform_filter else None
     return ManualContext(
         original_code=code,
@@ -240,36 +253,16 @@ def _format_pair(candidate: RedemptionCandidate) -> str:
     return f"{candidate.platform}:{candidate.game}"
 
 
-def _key_for_candidate(candidate: RedemptionCandidate) -> Key:
-    return candidate.key.copy().set(
-        platform=candidate.platform,
-        game=candidate.game,
-        code=candidate.code,
-    )
-
-
-def _failure_label_for_status(status: Status) -> str:
-    if status == Status.EXPIRED:
-        return "EXPIRED"
-    if status == Status.INVALID:
-        return "INVALID"
-    if status == Status.SLOWDOWN:
-        return "RATELIMIT"
-    if status == Status.TRYLATER:
-        return "TRYLATER"
-    if status == Status.REDIRECT:
-        return "NETWORK_ERROR"
-    if status in (Status.NONE, Status.UNKNOWN):
-        return "UNKNOWN_ERROR"
-    return getattr(status, "name", "UNKNOWN_ERROR")
-
-
-def _handle_skipped_candidates(context: ManualContext) -> None:
+def _handle_skipped_candidates(context: ManualContext) -> bool:
+    """Log and record skipped pairs; returns True if any was already redeemed."""
+    previous_success = False
+    preclassified = []
     for candidate in context.plan.skipped:
         pair = _format_pair(candidate)
         if candidate.skip_reason == "redeemed":
             _L.info(f"Previously recorded success for {pair}; skipping remote call.")
             candidate.previously_redeemed = True
+            previous_success = True
         elif candidate.skip_reason == "failed":
             reason = candidate.previously_failed or "UNKNOWN"
             reward_display = candidate.reward or "Unknown"
@@ -285,89 +278,135 @@ def _handle_skipped_candidates(context: ManualContext) -> None:
             status_label = candidate.preclassified_status or "EXPIRED"
             candidate.previously_failed = status_label
             if candidate.should_record_preclassification:
-                key_obj = _key_for_candidate(candidate)
-                query.db.record_failure(
-                    key_obj,
-                    candidate.platform,
-                    status_label,
-                    f"Preclassified expiry from source metadata ({candidate.reward})",
+                preclassified.append(
+                    (
+                        candidate.attempt_key(),
+                        candidate.platform,
+                        status_label,
+                        f"Preclassified expiry from source metadata ({candidate.reward})",
+                    )
                 )
         else:
             _L.info(
                 f"Skipping {pair}; reason={candidate.skip_reason or 'unknown'}."
             )
+    query.db.record_failures(preclassified)
+    return previous_success
 
 
 def _redeem_candidates(
     context: ManualContext,
     shift_client,
     redeem_cb,
-) -> tuple[List[AttemptResult], bool]:
-    results: List[AttemptResult] = []
-    hit_try_later = False
-
-    for candidate in context.plan.attempts:
-        attempt_key = _key_for_candidate(candidate)
-        _L.info(
-            f"Trying to redeem {candidate.reward} ({candidate.code}) "
-            f"on {candidate.platform} for {candidate.game}"
-        )
-        previous_status = (candidate.previously_failed or "").upper()
-        if previous_status in {"TRYLATER", "RATELIMIT", "NETWORK_ERROR"}:
+) -> RedeemOutcome:
+    """Attempt the plan's pairs one at a time.
+
+    Attempts must stay sequential: the status of each call is read back from
+    ``shift_client.last_status``, every call shares one logged-in session and
+    its CSRF tokens, and SHiFT throttles per account (SLOWDOWN / TRY LATER)
+    rather than per request, so parallel calls would only trip the limit sooner.
+    """
+    outcome = RedeemOutcome(results=[])
+    # failures are written in one transaction once the loop ends, even if it raises
+    pending_failures = []
+
+    attempts = context.plan.attempts
+    try:
+        for index, candidate in enumerate(attempts):
+            attempt_key = candidate.attempt_key()
             _L.info(
-                f"\t-> Retrying now because of Status: '{previous_status}' last run."
+                "Trying to redeem %s (%s) on %s for %s",
+                candidate.reward,
+                candidate.code,
+                candidate.platform,
+                candidate.game,
             )
-            hit_try_later = True
-
-        slowdown_retry = False
-        while True:
-            try:
-                redeem_cb(attempt_key)
-            except SystemExit:
-                raise
-            except Exception as exc:
-                _L.error(f"Redeem callback raised {exc}; treating as UNKNOWN status.")
-                shift_client.last_status = Status.UNKNOWN(str(exc))
-
-            status = getattr(shift_client, "last_status", Status.NONE)
-            if status == Status.SLOWDOWN and not slowdown_retry:
-                _L.info(
-                    f"Manual redeem hit SLOWDOWN; sleeping {SLEEP_TIMER}s before retrying same code."
-                )
-                slowdown_retry = True
-                sleep(SLEEP_TIMER)
-                continue
-            if status == Status.SLOWDOWN:
-                _L.info(
-                    "Manual redeem hit SLOWDOWN twice; treating as TRY LATER and stopping."
+            previous_status = (candidate.previously_failed or "").upper()
+            if previous_status in RETRYABLE_FAILURE_LABELS:
+                _L.info("\t-> Retrying now because of Status: '%s' last run.", previous_status)
+                outcome.hit_try_later = True
+
+            slowdown_retry = False
+            interrupted = False
+            while True:
+                try:
+                    redeem_cb(attempt_key)
+                except SystemExit:
+                    raise
+                except Exception as exc:
+                    _L.error("Redeem callback raised %s; treating as UNKNOWN status.", exc)
+                    shift_client.last_status = Status.UNKNOWN(str(exc))
+
+                status = getattr(shift_client, "last_status", Status.NONE)
+                action = _STATUS_ACTIONS.get(status)
+                if action == "slowdown":
+                    if not slowdown_retry:
+                        delay = _slowdown_delay(shift_client)
+                        _L.info(
+                            "Manual redeem hit SLOWDOWN; sleeping %gs before retrying same code.",
+                            delay,
+                        )
+                        slowdown_retry = True
+                        try:
+                            sleep(delay)
+                        except KeyboardInterrupt:
+                            # Ctrl+C during the back-off: keep the SLOWDOWN as this pair's
+                            # outcome (RATELIMIT is retried next run) and wind down cleanly
+                            _L.warning("Interrupted during SLOWDOWN wait; stopping manual redeem.")
+                            interrupted = True
+                            break
+                        continue
+                    _L.info(
+                        "Manual redeem hit SLOWDOWN twice; treating as TRY LATER and stopping."
+                    )
+                    status = Status.TRYLATER
+                    action = "trylater"
+                    shift_client.last_status = status
+                break
+
+            detail = format_status_detail(status, attempt_key)
+            result = AttemptResult(candidate=candidate, status=status, detail=detail)
+            outcome.results.append(result)
+
+            if action == "success":
+                outcome.any_success = True
+                candidate.previously_redeemed = True
+                candidate.previously_failed = None
+                candidate.failure_detail = None
+            else:
+                failure_label = failure_label_for_status(status)
+                pending_failures.append(
+                    (attempt_key, candidate.platform, failure_label, detail)
                 )
-                status = Status.TRYLATER
-                shift_client.last_status = status
-            break
-
-        detail = format_status_detail(status, attempt_key)
-        result = AttemptResult(candidate=candidate, status=status, detail=detail)
-        results.append(result)
-
-        if _is_positive_status(status):
-            candidate.previously_redeemed = True
-            candidate.previously_failed = None
-            candidate.failure_detail = None
-        else:
-            failure_label = _failure_label_for_status(status)
-            query.db.record_failure(
-                attempt_key,
-                candidate.platform,
-                failure_label,
-                detail,
+                candidate.previously_failed = failure_label
+                candidate.failure_detail = detail
+
+            if interrupted:
+                break
+
+            if action == "trylater":
+                outcome.hit_try_later = True
+                # SHiFT answers every further attempt with TRY LATER too; stop spending requests
+                remaining = len(attempts) - index - 1
+                if remaining:
+                    _L.info(
+                        "Stopping after TRY LATER; %d remaining attempt(s) left for a later run.",
+                        remaining,
+                    )
+                break
+    except BaseException:
+        # keep what was learned before the error, but never let a failing flush
+        # replace the exception that ended the loop
+        try:
+            query.db.record_failures(pending_failures)
+        except Exception as flush_exc:
+            _L.error(
+                "Could not record %d failed attempt(s): %s", len(pending_failures), flush_exc
             )
-            candidate.previously_failed = failure_label
-            candidate.failure_detail = detail
-
-        if status == Status.TRYLATER:
-            hit_try_later = True
+        raise
 
-    return results, hit_try_later
+    query.db.record_failures(pending_failures)
+    return outcome
 
 
 def _summarize_results(
@@ -380,7 +419,8 @@ def _summarize_results(
         _L.warning("Manual redeem skipped all attempts (no candidates).")
         return
 
-    if context.verbose:
+    debug_summary = context.verbose and _L.isEnabledFor(DEBUG)
+    if debug_summary:
         _L.debug("Manual redeem summary:")
         for candidate in plan.skipped:
             status_hint = (
@@ -391,47 +431,45 @@ def _summarize_results(
             extras = ""
             if str(status_hint).upper() == "EXPIRED":
                 extras = f" ({candidate.code}) ({candidate.reward or 'Unknown'})"
-            _L.debug(
-                f"  {_format_pair(candidate)} -> skipped ({status_hint}){extras}"
-            )
+            _L.debug("  %s -> skipped (%s)%s", _format_pair(candidate), status_hint, extras)
         for result in results:
             status_name = getattr(result.status, "name", str(result.status))
-            _L.debug(f"  {_format_pair(result.candidate)} -> {status_name}")
-
-    def _dedup(seq: Sequence[str]) -> List[str]:
-        return list(dict.fromkeys(seq))
+            _L.debug("  %s -> %s", _format_pair(result.candidate), status_name)
 
-    all_candidates: List[RedemptionCandidate] = list(plan.attempts) + list(plan.skipped)
-    platforms = _dedup([cand.platform for cand in all_candidates])
-    games = _dedup([cand.game for cand in all_candidates])
-    total_pairs = len(all_candidates)
+    total_pairs = len(plan.attempts) + len(plan.skipped)
+    # an early stop (TRY LATER, Ctrl+C) leaves planned attempts unrun; report handled/planned
+    handled_pairs = len(results) + len(plan.skipped)
+    count_text = (
+        str(total_pairs) if handled_pairs == total_pairs else f"{handled_pairs}/{total_pairs}"
+    )
+    platforms: dict[str, None] = {}
+    games: dict[str, None] = {}
+    for candidate in plan.attempts:
+        platforms[candidate.platform] = None
+        games[candidate.game] = None
 
-    status_counts: dict[str, int] = {}
-    status_platforms: dict[str, List[str]] = {}
-    status_order: List[str] = []
-    origin_counts: dict[str, int] = {}
+    status_counts: Counter[str] = Counter()
+    status_platforms: defaultdict[str, dict[str, None]] = defaultdict(dict)
+    origin_counts: Counter[str] = Counter()
 
     def _note_status(label: str, platform: str) -> None:
         if not label:
             label = "UNKNOWN"
-        if label not in status_counts:
-            status_counts[label] = 0
-            status_platforms[label] = []
-            status_order.append(label)
         status_counts[label] += 1
-        status_platforms[label].append(platform)
+        status_platforms[label][platform] = None
 
     for result in results:
         status = result.status
         if _is_positive_status(status):
             label = getattr(status, "name", str(status)) or "SUCCESS"
         else:
-            label = _failure_label_for_status(status)
+            label = failure_label_for_status(status)
         _note_status(label, result.candidate.platform)
-        origin = result.candidate.origin or "unknown"
-        origin_counts[origin] = origin_counts.get(origin, 0) + 1
+        origin_counts[result.candidate.origin or "unknown"] += 1
 
     for candidate in plan.skipped:
+        platforms[candidate.platform] = None
+        games[candidate.game] = None
         if candidate.skip_reason == "redeemed":
             label = "REDEEMED"
         elif candidate.skip_reason == "expired":
@@ -441,18 +479,17 @@ def _summarize_results(
         else:
             label = (candidate.skip_reason or "SKIPPED").upper()
         _note_status(label, candidate.platform)
-        origin = candidate.origin or "unknown"
-        origin_counts[origin] = origin_counts.get(origin, 0) + 1
+        origin_counts[candidate.origin or "unknown"] += 1
 
     summary_line = (
         f"Manual redeem outcome: [{plan.normalized_code}] - "
         f"[Platforms: {', '.join(platforms) if platforms else 'none'}] - "
         f"[Games: {', '.join(games) if games else 'none'}] - "
-        f"[Count {total_pairs}]"
+        f"[Count {count_text}]"
     )
     _L.info(summary_line)
 
-    if context.verbose and origin_counts:
+    if debug_summary and origin_counts:
         origin_labels = {
             "db": "database",
             "shift": "SHiFT source",
@@ -466,39 +503,26 @@ def _summarize_results(
             if key not in origin_labels:
                 origin_fragments.append(f"{key} {value}")
         if origin_fragments:
-            _L.debug("Count sources: " + ", ".join(origin_fragments))
-
-    if status_counts:
-        status_segments: List[str] = []
-        for label in status_order:
-            platforms_for_label = _dedup(status_platforms[label])
-            fragment = f"{label} x{status_counts[label]}"
-            if platforms_for_label:
-                fragment += f" ({', '.join(platforms_for_label)})"
-            status_segments.append(fragment)
-        status_line = "Status breakdown: " + "; ".join(status_segments)
-        if hit_try_later:
-            status_line += "; TRY-LATER encountered"
-        _L.info(status_line)
-    elif hit_try_later:
-        _L.info("Status breakdown: TRY-LATER encountered")
-
-
-def _ensure_manual_flags_allowed(args) -> None:
-    disallowed = []
-    if getattr(args, "golden", False):
-        disallowed.append("--golden")
-    if getattr(args, "non_golden", False):
-        disallowed.append("--non-golden")
-    if getattr(args, "other", False):
-        disallowed.append("--other")
-    if getattr(args, "_limit_was_supplied", False):
-        disallowed.append("--limit")
-    if getattr(args, "games", None):
-        disallowed.append("--games")
-    if getattr(args, "platforms", None):
-        disallowed.append("--platforms")
-    if getattr(args, "schedule", None) is not None:
+            _L.debug("Count sources: %s", ", ".join(origin_fragments))
+
+    status_segments = [
+        f"{label} x{count} ({', '.join(status_platforms[label])})"
+        if status_platforms[label]
+        else f"{label} x{count}"
+        for label, count in status_counts.items()
+    ]
+    if hit_try_later:
+        status_segments.append("TRY-LATER encountered")
+    if status_segments:
+        _L.info("Status breakdown: " + "; ".join(status_segments))
+
+
+def _ensure_manual_flags_allowed(args, schedule) -> None:
+    disallowed = [
+        label for attr, label in _DISALLOWED_FLAGS if getattr(args, attr, None)
+    ]
+    # an explicit schedule value is rejected even when it is falsy
+    if schedule is not None:
         disallowed.append("--schedule")
 
     if disallowed:
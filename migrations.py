@@ -1,5 +1,4 @@
 import os
-import re
 import sqlite3
 from typing import List, Union
 from common import DIRNAME, _L, dim_text
@@ -15,7 +14,20 @@ except Exception:
 
 
 DB_PATH = data_path("keys.db")
-CODE_PATTERN = re.compile(r"^[A-Za-z0-9]{5}(?:-[A-Za-z0-9]{5}){4}$")
+# Valid codes are five hyphen-joined blocks of five ASCII letters/digits; rows matching
+# this GLOB verbatim are valid and never leave SQLite.
+CODE_GLOB = "-".join(["[A-Za-z0-9]" * 5] * 5)
+
+
+def _is_valid_code(code: str) -> bool:
+    """True for five hyphen-joined blocks of five ASCII letters/digits."""
+    return (
+        len(code) == 29
+        and code[5] == code[11] == code[17] == code[23] == "-"
+        and code.count("-") == 4
+        and code.isascii()
+        and code.replace("-", "").isalnum()
+    )
 
 
 def migrate_shift_codes():
@@ -33,16 +45,20 @@ def migrate_shift_codes():
             # Avoid user-facing noise when the upgrade hasn't run yet.
             _L.debug("Skipping code format migration: 'code' column does not exist yet.")
             return
-        c.execute("SELECT id, code FROM keys")
-        rows = c.fetchall()
+        # stream the scan instead of fetchall(); only rejected rows are kept in memory.
+        # The GLOB drops well-formed codes in SQLite; Python still decides the rest
+        # (e.g. codes with surrounding whitespace are kept after strip()).
         to_remove = []
-        for row in rows:
-            code_raw = str(row[1])
-            code_stripped = code_raw.strip()
-            if not CODE_PATTERN.match(code_stripped):
-                to_remove.append((row[0], code_raw))
+        suspects = conn.execute(
+            "SELECT id, code FROM keys WHERE code IS NULL OR code NOT GLOB ? ORDER BY id",
+            (CODE_GLOB,),
+        )
+        for key_id, code in suspects:
+            code_raw = str(code)
+            if not _is_valid_code(code_raw.strip()):
+                to_remove.append((key_id, code_raw))
         if to_remove:
-            c.executemany("DELETE FROM keys WHERE id = ?", [(i,) for i, _ in to_remove])
+            c.executemany("DELETE FROM keys WHERE id = ?", ((i,) for i, _ in to_remove))
             conn.commit()
             removed_codes = [code for _, code in to_remove]
             _L.info(
@@ -66,16 +82,25 @@ def register(version: int):
         @wraps(func)
         def wrapper(conn, *args, **kwargs):  # Accept extra arguments for compatibility
             try:
+                # sqlite3 only opens a transaction on its own before DML, so schema
+                # statements would autocommit one by one. An explicit BEGIN puts the
+                # whole migration and its version bump into a single commit.
+                conn.execute("BEGIN")
                 if func(conn):
                     conn.cursor().execute("PRAGMA user_version = {}".format(version))
                     conn.commit()
                     return True
+                conn.rollback()
             except sqlite3.OperationalError:
+                conn.rollback()
                 _L.error(
                     "There was an error while migrating database to version {}."
                     "Please contact the developer @ github.com/fabbi".format(version)
                 )
                 return False
+            except Exception:
+                conn.rollback()
+                raise
 
         migrationFunctions[version] = wrapper
         return wrapper
@@ -100,16 +125,18 @@ def update_1(conn: sqlite3.Connection):
         CREATE VIEW tmp AS
         SELECT * FROM keys
         WHERE platform="pc";
-        -- AND redeemed=0;
-
+        """,
+        """
         INSERT INTO keys(reward, code, platform, game, redeemed)
         SELECT reward, code, "epic", game, redeemed
         FROM tmp;
-
+        """,
+        """
         UPDATE keys
         SET platform="steam"
         WHERE id in (select id from tmp);
-
+        """,
+        """
         DROP VIEW tmp;
         """,
         """
@@ -143,7 +170,9 @@ def update_1(conn: sqlite3.Connection):
             if isinstance(step, tuple):
                 c.execute(*step)
             else:
-                c.executescript(step)
+                # one statement per step: executescript() would COMMIT the
+                # transaction register() opened for this migration
+                c.execute(step)
         except sqlite3.OperationalError as e:
             _L.error(f"'{e}' in\n{step}")
             return False
@@ -210,7 +239,6 @@ def migrate_redeemed_table(conn):
     )
     c.execute(f"INSERT INTO keys ({columns_str}) SELECT {columns_str} FROM keys_old")
     c.execute("DROP TABLE keys_old")
-    conn.commit()
     return True
 
 
@@ -241,7 +269,6 @@ def add_failed_keys_table(conn: sqlite3.Connection):
     if "source" not in existing_columns:
         c.execute("ALTER TABLE keys ADD COLUMN source TEXT")
 
-    conn.commit()
     return True
 
 
@@ -270,15 +297,15 @@ def extend_redeemed_keys_table(conn: sqlite3.Connection):
             """
         )
         c.execute("DROP TABLE IF EXISTS redeemed_keys_old_v5")
-        conn.commit()
         return True
 
-    # Detect legacy FK pointing to keys_old or missing columns
-    c.execute("PRAGMA foreign_key_list(redeemed_keys)")
-    fk_targets = {row[2] for row in c.fetchall()}
-    needs_rebuild = ("status" not in column_names) or ("detail" not in column_names)
-    needs_rebuild = needs_rebuild or ("attempted_at" not in column_names)
-    needs_rebuild = needs_rebuild or (fk_targets and "keys" not in fk_targets)
+    # Detect missing columns or legacy FK pointing to keys_old; the FK pragma is
+    # only consulted when the columns alone don't already force a rebuild
+    needs_rebuild = not {"status", "detail", "attempted_at"} <= column_names
+    if not needs_rebuild:
+        c.execute("PRAGMA foreign_key_list(redeemed_keys)")
+        fk_targets = {row[2] for row in c.fetchall()}
+        needs_rebuild = bool(fk_targets) and "keys" not in fk_targets
 
     if needs_rebuild:
         # Rebuild table to ensure clean schema and preserve existing data when available.
@@ -316,7 +343,6 @@ def extend_redeemed_keys_table(conn: sqlite3.Connection):
             f"SELECT {select_sql} FROM redeemed_keys_old_v5"
         )
         c.execute("DROP TABLE redeemed_keys_old_v5")
-        conn.commit()
         return True
 
     # Columns exist but may be NULL; backfill defaults and ensure attempted_at present
@@ -327,7 +353,6 @@ def extend_redeemed_keys_table(conn: sqlite3.Connection):
             "UPDATE redeemed_keys SET attempted_at = COALESCE(attempted_at, CURRENT_TIMESTAMP)"
         )
 
-    conn.commit()
     return True
 
 
@@ -343,5 +368,13 @@ def backfill_seen_platform_names(conn: sqlite3.Connection):
         WHERE name IS NULL OR TRIM(name) = ''
         """
     )
-    conn.commit()
+    return True
+
+
+@register(7)
+def add_keys_code_index(conn: sqlite3.Connection):
+    """Index keys.code; every plan build and outcome lookup filters on it."""
+
+    c = conn.cursor()
+    c.execute("CREATE INDEX IF NOT EXISTS idx_keys_code ON keys(code)")
     return True
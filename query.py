@@ -31,6 +31,7 @@ from typing import (
     Iterable,
     Iterator,
     Optional,
+    Tuple,
     TypeVar,
 )
 
@@ -249,7 +250,10 @@ class Key:
     def __init__(self, **kwargs):
         self.redeemed = False
         self.id = None
-        self.source = kwargs.get("source")
+        self.reward = None
+        self.source = None
+        self.expires = None
+        self.expired = False
         self.set(**kwargs)
 
     def set(self, **kwargs):
@@ -257,6 +261,10 @@ class Key:
             setattr(self, k, kwargs[k])
         return self
 
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Key":
+        return cls(**dict(zip(row.keys(), row)))
+
     def copy(self):
         return Key(**{k: getattr(self, k) for k in self.__slots__ if hasattr(self, k)})
 
@@ -274,6 +282,41 @@ class Key:
         return str(self)
 
 
+# Statements shared by the hot key lookups; columns are listed so rows match Key.__slots__.
+_KEY_COLUMNS = "id, reward, code, platform, game, source"
+_SQL_KEYS_FOR_CODE = f"SELECT {_KEY_COLUMNS} FROM keys WHERE code = ? ORDER BY id ASC"
+_SQL_KEY_FOR_PAIR = (
+    f"SELECT {_KEY_COLUMNS} FROM keys "
+    "WHERE code = ? AND game = ? AND platform = ? ORDER BY id DESC LIMIT 1"
+)
+_SQL_KEY_EXISTS = "SELECT 1 FROM keys WHERE code = ? AND game = ? AND platform = ? LIMIT 1"
+# codes per `code IN (...)` lookup; stays under SQLite's older 999 host-parameter limit
+_CODE_LOOKUP_CHUNK = 500
+_SQL_INSERT_KEY = "INSERT INTO keys(reward, code, platform, game, source) VALUES (?,?,?,?,?)"
+_SQL_RECORD_FAILURE = """
+    INSERT INTO failed_keys (key_id, platform, status, detail, attempted_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(key_id, platform) DO UPDATE SET
+        status = excluded.status,
+        detail = excluded.detail,
+        attempted_at = excluded.attempted_at
+"""
+# Both outcome tables for one code in a single round trip; `outcome` says which table a row is from.
+_SQL_OUTCOMES_FOR_CODE = """
+    SELECT 'redeemed' AS outcome, keys.id AS key_id, keys.game, rk.platform,
+           rk.status, rk.detail, rk.attempted_at
+    FROM redeemed_keys rk
+    JOIN keys ON keys.id = rk.key_id
+    WHERE keys.code = ?
+    UNION ALL
+    SELECT 'failed' AS outcome, keys.id AS key_id, keys.game, fk.platform,
+           fk.status, fk.detail, fk.attempted_at
+    FROM failed_keys fk
+    JOIN keys ON keys.id = fk.key_id
+    WHERE keys.code = ?
+"""
+
+
 class Database(ContextManager):
     __conn: sqlite3.Connection
     __c: sqlite3.Cursor
@@ -304,6 +347,12 @@ class Database(ContextManager):
             return self.__c.execute(sql, parameters)
         return self.__c.execute(sql)
 
+    def executemany(self, sql, seq_of_parameters):
+        self.__open_db()
+        if not self.__updated:
+            self.__update_db()
+        return self.__c.executemany(sql, seq_of_parameters)
+
     def commit(self):
         if not self.__open:
             return
@@ -317,6 +366,7 @@ class Database(ContextManager):
 
         # self.close_db()
         # self.__open_db()
+        migrated = False
         while (self.version + 1) in migrationFunctions:
             if not self.__create_db:
                 _L.info(f"Migrating database to version {self.version+1}")
@@ -327,6 +377,12 @@ class Database(ContextManager):
             if not self.__create_db:
                 _L.info(f"migration to version {self.version+1} successful")
             self.version += 1
+            migrated = True
+
+        if migrated and not self.__create_db:
+            # refresh planner statistics for indexes added by migrations
+            self.__c.execute("ANALYZE")
+            self.__conn.commit()
 
         self.__updated = True
 
@@ -367,40 +423,68 @@ class Database(ContextManager):
 
     def insert(self, key: Key):
         """Insert key"""
-        el = self.execute(
-            """SELECT * FROM keys
-                    WHERE platform = ?
-                    AND code = ?
-                    AND game = ?""",
-            (key.platform, key.code, key.game),
-        )
+        el = self.execute(_SQL_KEY_EXISTS, (key.code, key.game, key.platform))
         if el.fetchone():
             return None
         message = f"== inserting {key.game} Key '{key.code}' for {key.platform} =="
         _L.debug(dim_text(message), extra={"rich_markup": True})
         self.execute(
-            "INSERT INTO keys(reward, code, platform, game, source) VALUES (?,?,?,?,?)",
+            _SQL_INSERT_KEY,
             (
-                getattr(key, "reward", None),
+                key.reward,
                 key.code,
                 key.platform,
                 key.game,
-                getattr(key, "source", None),
+                key.source,
             ),
         )
         self.commit()
         return key
 
+    def insert_many(self, keys: Iterable[Key]) -> list[Key]:
+        """Insert all keys not stored yet in one transaction; returns the inserted ones"""
+        keys = list(keys)
+        # only rows sharing a code with the batch can collide; fetch just those
+        codes = list({key.code for key in keys})
+        existing = set()
+        for start in range(0, len(codes), _CODE_LOOKUP_CHUNK):
+            chunk = codes[start : start + _CODE_LOOKUP_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.execute(
+                f"SELECT code, game, platform FROM keys WHERE code IN ({placeholders})",
+                chunk,
+            )
+            existing.update((row["code"], row["game"], row["platform"]) for row in rows)
+        inserted = []
+        for key in keys:
+            ident = (key.code, key.game, key.platform)
+            if ident in existing:
+                continue
+            existing.add(ident)
+            message = f"== inserting {key.game} Key '{key.code}' for {key.platform} =="
+            _L.debug(dim_text(message), extra={"rich_markup": True})
+            inserted.append(key)
+
+        if inserted:
+            self.executemany(
+                _SQL_INSERT_KEY,
+                [
+                    (
+                        key.reward,
+                        key.code,
+                        key.platform,
+                        key.game,
+                        key.source,
+                    )
+                    for key in inserted
+                ],
+            )
+            self.commit()
+        return inserted
+
     def fetch_keys_for_code(self, code: str) -> list[Key]:
-        rows = self.execute(
-            """
-            SELECT * FROM keys
-            WHERE code = ?
-            ORDER BY id ASC
-            """,
-            (code,),
-        ).fetchall()
-        return [Key(**{col: row[col] for col in row.keys()}) for row in rows]
+        rows = self.execute(_SQL_KEYS_FOR_CODE, (code,)).fetchall()
+        return [Key.from_row(row) for row in rows]
 
     def ensure_key(
         self,
@@ -410,117 +494,74 @@ class Database(ContextManager):
         platform: str,
         reward: Optional[str] = None,
         source: Optional[str] = None,
+        known: Optional[Dict[Tuple[str, str], Key]] = None,
+        commit: bool = True,
     ) -> Key:
-        reward_value = reward.strip() if isinstance(reward, str) else reward
-        row = self.execute(
-            """
-            SELECT * FROM keys
-            WHERE code = ? AND game = ? AND platform = ?
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (code, game, platform),
-        ).fetchone()
+        """Return the newest row for (code, game, platform), inserting it if missing.
 
-        if row:
-            key = Key(**{col: row[col] for col in row.keys()})
-            updates = []
-            params = []
+        ``known`` maps (game, platform) to the newest stored row of ``code``.
+        When given it replaces the lookup query, is kept in sync with written rows,
+        and callers get copies of its entries.
+        With ``commit=False`` the write is left pending for the caller to commit.
+        """
+        reward_value = reward.strip() if isinstance(reward, str) else reward
+        if known is not None:
+            key = known.get((game, platform))
+        else:
+            row = self.execute(_SQL_KEY_FOR_PAIR, (code, game, platform)).fetchone()
+            key = Key.from_row(row) if row else None
 
+        if key:
+            changes = {}
             if reward_value and (not key.reward or key.reward == "Unknown"):
-                updates.append("reward = ?")
-                params.append(reward_value)
-            if source and not getattr(key, "source", None):
-                updates.append("source = ?")
-                params.append(source)
-
-            if updates:
-                params.append(key.id)
+                changes["reward"] = reward_value
+            if source and not key.source:
+                changes["source"] = source
+
+            if changes:
                 self.execute(
-                    f"UPDATE keys SET {', '.join(updates)} WHERE id = ?",
-                    params,
+                    f"UPDATE keys SET {', '.join(f'{col} = ?' for col in changes)} WHERE id = ?",
+                    (*changes.values(), key.id),
                 )
-                self.commit()
-                if reward_value:
-                    key.reward = reward_value
-                if source:
-                    key.source = source
+                if commit:
+                    self.commit()
+                key.set(**changes)
 
-            return key
+            return key.copy() if known is not None else key
 
         insert_reward = reward_value or "Unknown"
-        self.execute(
-            "INSERT INTO keys(reward, code, platform, game, source) VALUES (?,?,?,?,?)",
+        cur = self.execute(
+            _SQL_INSERT_KEY,
             (insert_reward, code, platform, game, source),
         )
-        self.commit()
-
-        created = self.execute(
-            """
-            SELECT * FROM keys
-            WHERE code = ? AND game = ? AND platform = ?
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (code, game, platform),
-        ).fetchone()
-
-        if not created:
-            raise RuntimeError("Failed to persist key entry")
-
-        return Key(**{col: created[col] for col in created.keys()})
+        if commit:
+            self.commit()
+
+        key = Key(
+            id=cur.lastrowid,
+            reward=insert_reward,
+            code=code,
+            platform=platform,
+            game=game,
+            source=source,
+        )
+        if known is not None:
+            known[(game, platform)] = key
+            return key.copy()
+        return key
 
     def fetch_outcomes_for_code(self, code: str):
-        redeemed_rows = self.execute(
-            """
-            SELECT keys.id AS key_id,
-                   keys.game,
-                   rk.platform,
-                   rk.status,
-                   rk.detail,
-                   rk.attempted_at
-            FROM redeemed_keys rk
-            JOIN keys ON keys.id = rk.key_id
-            WHERE keys.code = ?
-            """,
-            (code,),
-        ).fetchall()
+        rows = self.execute(_SQL_OUTCOMES_FOR_CODE, (code, code)).fetchall()
 
         redeemed = {}
-        for row in redeemed_rows:
-            game = row["game"]
-            platform = row["platform"]
-            if game is None or platform is None:
-                continue
-            redeemed[(game, platform)] = {
-                "key_id": row["key_id"],
-                "status": row["status"],
-                "detail": row["detail"],
-                "attempted_at": row["attempted_at"],
-            }
-
-        failed_rows = self.execute(
-            """
-            SELECT keys.id AS key_id,
-                   keys.game,
-                   fk.platform,
-                   fk.status,
-                   fk.detail,
-                   fk.attempted_at
-            FROM failed_keys fk
-            JOIN keys ON keys.id = fk.key_id
-            WHERE keys.code = ?
-            """,
-            (code,),
-        ).fetchall()
-
         failed = {}
-        for row in failed_rows:
+        for row in rows:
             game = row["game"]
             platform = row["platform"]
             if game is None or platform is None:
                 continue
-            failed[(game, platform)] = {
+            target = redeemed if row["outcome"] == "redeemed" else failed
+            target[(game, platform)] = {
                 "key_id": row["key_id"],
                 "status": row["status"],
                 "detail": row["detail"],
@@ -531,8 +572,7 @@ class Database(ContextManager):
 
     def get_keys(self, platform, game, all_keys=False):
         """Get all (unredeemed) keys of given platform and game"""
-        cmd = """
-            SELECT * FROM keys"""
+        cmd = f"SELECT {_KEY_COLUMNS} FROM keys"
         params = []
 
         if platform:
@@ -555,7 +595,7 @@ class Database(ContextManager):
 
         row: sqlite3.Row
         for row in ex.fetchall():
-            yield Key(**{k: row[k] for k in row.keys()})
+            yield Key.from_row(row)
 
     def get_special_keys(self, platform, game):
         keys = self.get_keys(platform, game)
@@ -614,17 +654,21 @@ class Database(ContextManager):
         if getattr(key, "id", None) is None:
             raise ValueError("Cannot record failure without a persisted key id")
 
-        self.execute(
-            """
-            INSERT INTO failed_keys (key_id, platform, status, detail, attempted_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(key_id, platform) DO UPDATE SET
-                status = excluded.status,
-                detail = excluded.detail,
-                attempted_at = excluded.attempted_at
-            """,
-            (key.id, platform, status, detail),
-        )
+        self.execute(_SQL_RECORD_FAILURE, (key.id, platform, status, detail))
+        self.commit()
+
+    def record_failures(
+        self, entries: Iterable[Tuple[Key, str, str, Optional[str]]]
+    ) -> None:
+        """Record several (key, platform, status, detail) failures in one transaction"""
+        params = []
+        for key, platform, status, detail in entries:
+            if getattr(key, "id", None) is None:
+                raise ValueError("Cannot record failure without a persisted key id")
+            params.append((key.id, platform, status, detail))
+        if not params:
+            return
+        self.executemany(_SQL_RECORD_FAILURE, params)
         self.commit()
 
     def saw_game(self, short, name):
@@ -744,8 +788,7 @@ def parse_shift_orcicorn():
             key.set(platform=get_short_platform_key(key.platform))
             key.set(source=code_source)
             # Ensure expired flag is boolean for downstream consumers
-            if hasattr(key, "expired"):
-                key.set(expired=_coerce_bool(getattr(key, "expired", False)))
+            key.set(expired=_coerce_bool(key.expired))
 
         yield from keys
 
@@ -760,9 +803,9 @@ def update_keys():
         _L.info("Checking for new keys!")
 
     keys = list(parse_shift_orcicorn())
-    new_keys = [db.insert(key) for key in keys]
+    new_keys = db.insert_many(keys)
 
-    counts = Counter(key.game for key in new_keys if key)
+    counts = Counter(key.game for key in new_keys)
     for game, count in sorted(counts.items()):
         _L.info(f"Got {count} new keys for {known_games[game]}")
 
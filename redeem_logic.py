@@ -5,23 +5,49 @@ import datetime as _dt
 import re
 from dataclasses import dataclass, field
 from functools import lru_cache
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from itertools import chain
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
-from common import _L
+from common import _L, DATACLASS_SLOTS
 import query
 from query import ALL_SUPPORTED_GAMES, ALL_SUPPORTED_PLATFORMS, Key
 from shift import Status
 
 UTC = _dt.timezone.utc
+_ZERO_OFFSET = _dt.timedelta(0)
+_TRUE_FLAG_STRINGS = frozenset(("true", "1", "yes", "y"))
 
-_CODE_RE = re.compile(r"^[A-Z0-9-]{5}(?:[A-Z0-9-]{5}){4}$", re.IGNORECASE)
 _STRIP_RE = re.compile(r"[^A-Z0-9]", re.IGNORECASE)
+# Deletes every ASCII character that is not a letter or digit (fast path for _STRIP_RE).
+_STRIP_TABLE = str.maketrans(
+    "", "", "".join(chr(c) for c in range(128) if not chr(c).isalnum())
+)
 _ORIGIN_PRIORITY = {"db": 0, "shift": 1, "fallback": 2}
+# Labels stored in failed_keys.status; Status hashes by name, so parametrized
+# members such as Status.UNKNOWN("...") resolve too.
+_FAILURE_LABELS = {
+    Status.EXPIRED: "EXPIRED",
+    Status.INVALID: "INVALID",
+    Status.SLOWDOWN: "RATELIMIT",
+    Status.TRYLATER: "TRYLATER",
+    Status.REDIRECT: "NETWORK_ERROR",
+    Status.NONE: "UNKNOWN_ERROR",
+    Status.UNKNOWN: "UNKNOWN_ERROR",
+}
+# Stored failure labels that are transient: the pair is retried first on the next run.
+RETRYABLE_FAILURE_LABELS = frozenset(("TRYLATER", "RATELIMIT", "NETWORK_ERROR"))
 _SUPPORTED_GAME_SET = set(ALL_SUPPORTED_GAMES)
 _SUPPORTED_PLATFORM_SET = set(ALL_SUPPORTED_PLATFORMS)
+_GAME_INDEX = {game: i for i, game in enumerate(ALL_SUPPORTED_GAMES)}
+_PLATFORM_INDEX = {platform: i for i, platform in enumerate(ALL_SUPPORTED_PLATFORMS)}
+_PLATFORM_COUNT = len(ALL_SUPPORTED_PLATFORMS)
+_SLOT_COUNT = len(ALL_SUPPORTED_GAMES) * _PLATFORM_COUNT
+# strptime fallbacks for expiry text fromisoformat rejects, keyed by the length they produce
+_EXPIRY_FORMATS = {19: "%Y-%m-%d %H:%M:%S", 16: "%Y-%m-%d %H:%M", 10: "%Y-%m-%d"}
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class RedemptionCandidate:
     code: str
     game: str
@@ -40,9 +66,17 @@ class RedemptionCandidate:
     failure_detail: Optional[str] = None
     should_record_preclassification: bool = False
     priority: int = field(default=99)
+    reward_unknown: bool = field(default=False, init=False, repr=False)
 
+    def __post_init__(self) -> None:
+        self.reward_unknown = self.reward.strip().lower() == "unknown"
 
-@dataclass
+    def attempt_key(self) -> Key:
+        """Fresh copy of this pair's Key to redeem or record with."""
+        return self.key.copy().set(platform=self.platform, game=self.game, code=self.code)
+
+
+@dataclass(**DATACLASS_SLOTS)
 class RedemptionPlan:
     code: str
     normalized_code: str
@@ -55,28 +89,39 @@ class RedemptionPlan:
     source_keys: List[Key]
     reward_hint: str
     db_had_code: bool
+    # every candidate keyed by (game, platform); attempts and skipped never share a pair
+    by_pair: Mapping[Tuple[str, str], RedemptionCandidate] = field(
+        default_factory=dict, repr=False
+    )
+
+    def lookup(
+        self, game: str, platform: str
+    ) -> Tuple[Optional[RedemptionCandidate], Optional[str]]:
+        candidate = self.by_pair.get((game, platform))
+        if candidate is None:
+            return None, None
+        return candidate, "skip" if candidate.skip_reason else "attempt"
 
 
+@lru_cache(maxsize=4096)
 def normalize_shift_code(raw: str) -> Optional[str]:
     if not raw:
         return None
-    candidate = raw.strip().upper()
-    if not _CODE_RE.match(candidate):
-        candidate = _STRIP_RE.sub("", candidate)
-        if len(candidate) != 25 or not candidate.isalnum():
-            return None
-    else:
+    candidate = raw.upper().translate(_STRIP_TABLE)
+    if not candidate.isascii():
         candidate = _STRIP_RE.sub("", candidate)
+    if len(candidate) != 25 or not candidate.isalnum():
+        return None
 
-    blocks = [candidate[i : i + 5] for i in range(0, 25, 5)]
-    return "-".join(blocks)
+    return "-".join(
+        (candidate[0:5], candidate[5:10], candidate[10:15], candidate[15:20], candidate[20:25])
+    )
 
 
-def normalize_requested_platforms(platforms: Optional[Sequence[str]]) -> List[str]:
-    if not platforms:
-        return list(ALL_SUPPORTED_PLATFORMS)
+def normalize_requested_platforms(platforms: Optional[Sequence[str]]) -> Sequence[str]:
+    if not platforms or platforms is ALL_SUPPORTED_PLATFORMS:
+        return ALL_SUPPORTED_PLATFORMS
 
-    normalized: List[str] = []
     seen: set[str] = set()
     for token in platforms:
         if not token:
@@ -85,26 +130,17 @@ def normalize_requested_platforms(platforms: Optional[Sequence[str]]) -> List[st
         if canonical in (None, "manual"):
             continue
         if canonical == "universal":
-            for plat in ALL_SUPPORTED_PLATFORMS:
-                if plat not in seen:
-                    seen.add(plat)
-                    normalized.append(plat)
+            seen.update(ALL_SUPPORTED_PLATFORMS)
             continue
         if canonical not in _SUPPORTED_PLATFORM_SET:
             _L.debug(f"Ignoring unsupported platform token '{token}' in manual filter")
             continue
-        if canonical not in seen:
-            seen.add(canonical)
-            normalized.append(canonical)
+        seen.add(canonical)
 
-    if not normalized:
+    if not seen:
         raise ValueError("No supported platforms remain after normalization.")
 
-    ordered = [plat for plat in ALL_SUPPORTED_PLATFORMS if plat in seen]
-    for plat in normalized:
-        if plat not in ordered:
-            ordered.append(plat)
-    return ordered
+    return [plat for plat in ALL_SUPPORTED_PLATFORMS if plat in seen]
 
 
 def build_redemption_plan(
@@ -120,6 +156,8 @@ def build_redemption_plan(
     requested = normalize_requested_platforms(requested_platforms)
 
     db_keys = query.db.fetch_keys_for_code(normalized_code)
+    # rows come back oldest first, so the newest row wins each (game, platform)
+    stored_rows = {(key.game, key.platform): key.copy() for key in db_keys}
     source_keys = _load_source_matches(normalized_code)
 
     matched_games = _determine_matched_games(db_keys, source_keys)
@@ -129,58 +167,61 @@ def build_redemption_plan(
         else list(ALL_SUPPORTED_GAMES)
     )
 
-    candidates: Dict[Tuple[str, str], RedemptionCandidate] = {}
-
-    for key in db_keys:
-        game = _normalize_game(key.game)
-        if not game or game not in matched_games and matched_games:
-            continue
-        for platform in _expand_platforms(key.platform, requested):
-            candidate = _make_candidate(
-                normalized_code,
-                game,
-                platform,
-                reward=getattr(key, "reward", None),
-                origin="db",
-                source=getattr(key, "source", None) or "database",
-                expires=getattr(key, "expires", None),
-                expired_flag=_normalize_expired_flag(getattr(key, "expired", False)),
-            )
-            _upsert_candidate(candidates, candidate)
-
-    for key in source_keys:
-        game = _normalize_game(key.game)
-        if not game or game not in matched_games and matched_games:
-            continue
-        for platform in _expand_platforms(key.platform, requested):
-            candidate = _make_candidate(
-                normalized_code,
-                game,
-                platform,
-                reward=getattr(key, "reward", None),
-                origin="shift",
-                source=getattr(key, "source", None) or "shift_source",
-                expires=getattr(key, "expires", None),
-                expired_flag=_normalize_expired_flag(getattr(key, "expired", False)),
-            )
-            _upsert_candidate(candidates, candidate)
+    candidates: List[Optional[RedemptionCandidate]] = [None] * _SLOT_COUNT
 
-    if not candidates:
-        for game in games_to_probe:
-            for platform in requested:
+    origin_groups = (
+        (db_keys, "db", "database"),
+        (source_keys, "shift", "shift_source"),
+    )
+    filter_games = bool(matched_games)
+    requested_set = frozenset(requested)
+    for keys, origin, default_source in origin_groups:
+        priority = _ORIGIN_PRIORITY[origin]
+        for key in keys:
+            game = _normalize_game(key.game)
+            if not game or (filter_games and game not in matched_games):
+                continue
+            reward = key.reward
+            source = key.source or default_source
+            expires = key.expires
+            expired_flag = _normalize_expired_flag(key.expired)
+            for platform in _expand_platforms(key.platform, requested, requested_set):
                 candidate = _make_candidate(
                     normalized_code,
                     game,
                     platform,
-                    reward="Unknown",
-                    origin="fallback",
-                    source="fallback",
-                    expires=None,
-                    expired_flag=False,
+                    reward=reward,
+                    origin=origin,
+                    priority=priority,
+                    source=source,
+                    expires=expires,
+                    expired_flag=expired_flag,
+                    stored_rows=stored_rows,
                 )
                 _upsert_candidate(candidates, candidate)
 
-    ordered_candidates = _order_candidates(candidates, games_to_probe)
+    ordered_candidates = _order_candidates(candidates)
+    if not ordered_candidates:
+        fallback_priority = _ORIGIN_PRIORITY["fallback"]
+        ordered_candidates = [
+            _make_candidate(
+                normalized_code,
+                game,
+                platform,
+                reward="Unknown",
+                origin="fallback",
+                priority=fallback_priority,
+                source="fallback",
+                expires=None,
+                expired_flag=False,
+                stored_rows=stored_rows,
+            )
+            for game in games_to_probe
+            for platform in requested
+        ]
+
+    # _make_candidate leaves its key inserts/updates pending; land them in one commit
+    query.db.commit()
     attempts, skipped = _apply_skip_logic(ordered_candidates, normalized_code, bypass_fail)
 
     reward_hint = _determine_reward_hint(ordered_candidates)
@@ -197,31 +238,23 @@ def build_redemption_plan(
         source_keys=source_keys,
         reward_hint=reward_hint,
         db_had_code=bool(db_keys),
+        by_pair=MappingProxyType(
+            {(candidate.game, candidate.platform): candidate for candidate in ordered_candidates}
+        ),
     )
 
 
 def _determine_reward_hint(candidates: Iterable[RedemptionCandidate]) -> str:
     for candidate in candidates:
-        reward = (candidate.reward or "").strip()
-        if reward and reward.lower() != "unknown":
-            return reward
+        if not candidate.reward_unknown and candidate.reward:
+            return candidate.reward
     return "Unknown"
 
 
 def _order_candidates(
-    candidates: Dict[Tuple[str, str], RedemptionCandidate],
-    games_to_probe: Sequence[str],
+    candidates: Sequence[Optional[RedemptionCandidate]],
 ) -> List[RedemptionCandidate]:
-    ordered: List[RedemptionCandidate] = []
-    present_games = {game for game, _ in candidates.keys()}
-    for game in games_to_probe:
-        if game not in present_games:
-            continue
-        for platform in ALL_SUPPORTED_PLATFORMS:
-            candidate = candidates.get((game, platform))
-            if candidate:
-                ordered.append(candidate)
-    return ordered
+    return [candidate for candidate in candidates if candidate is not None]
 
 
 def _apply_skip_logic(
@@ -235,7 +268,6 @@ def _apply_skip_logic(
     retryable_attempts: List[RedemptionCandidate] = []
     attempts: List[RedemptionCandidate] = []
     skipped: List[RedemptionCandidate] = []
-    retry_statuses = {"TRYLATER", "RATELIMIT", "NETWORK_ERROR"}
 
     for candidate in candidates:
         pair = (candidate.game, candidate.platform)
@@ -244,12 +276,8 @@ def _apply_skip_logic(
         if failure:
             candidate.previously_failed = failure.get("status")
             candidate.failure_detail = failure.get("detail")
-            failure_status = (candidate.previously_failed or "").upper()
-            if failure_status in retry_statuses:
-                candidate.skip_reason = None
-                retryable_attempts.append(candidate)
-                continue
 
+        # a recorded success wins over a retryable failure
         success = redeemed_map.get(pair)
         if success:
             candidate.previously_redeemed = True
@@ -258,6 +286,11 @@ def _apply_skip_logic(
             skipped.append(candidate)
             continue
 
+        if failure and (candidate.previously_failed or "").upper() in RETRYABLE_FAILURE_LABELS:
+            candidate.skip_reason = None
+            retryable_attempts.append(candidate)
+            continue
+
         expired_now = candidate.expired_flag or (
             candidate.expires_at is not None and candidate.expires_at <= now
         )
@@ -278,23 +311,29 @@ def _apply_skip_logic(
         candidate.skip_reason = None
         attempts.append(candidate)
 
-    return retryable_attempts + attempts, skipped
+    retryable_attempts.extend(attempts)
+    return retryable_attempts, skipped
+
+
+def _slot_index(game: str, platform: str) -> int:
+    return _GAME_INDEX[game] * _PLATFORM_COUNT + _PLATFORM_INDEX[platform]
 
 
 def _upsert_candidate(
-    candidates: Dict[Tuple[str, str], RedemptionCandidate],
+    candidates: List[Optional[RedemptionCandidate]],
     candidate: RedemptionCandidate,
 ) -> None:
-    key = (candidate.game, candidate.platform)
-    existing = candidates.get(key)
+    slot = _slot_index(candidate.game, candidate.platform)
+    existing = candidates[slot]
     if not existing or candidate.priority < existing.priority:
-        candidates[key] = candidate
+        candidates[slot] = candidate
         return
     if candidate.priority > existing.priority:
         return
 
-    if existing.reward.strip().lower() == "unknown" and candidate.reward.strip():
+    if existing.reward_unknown and not candidate.reward_unknown:
         existing.reward = candidate.reward
+        existing.reward_unknown = False
 
     if existing.expires_at is None and candidate.expires_at is not None:
         existing.expires_at = candidate.expires_at
@@ -314,9 +353,11 @@ def _make_candidate(
     *,
     reward: Optional[str],
     origin: str,
+    priority: int,
     source: Optional[str],
     expires: Optional[str],
     expired_flag: bool,
+    stored_rows: Optional[Dict[Tuple[str, str], Key]] = None,
 ) -> RedemptionCandidate:
     reward_value = (reward or "").strip() or "Unknown"
     key_obj = query.db.ensure_key(
@@ -325,6 +366,8 @@ def _make_candidate(
         platform=platform,
         reward=reward_value,
         source=source,
+        known=stored_rows,
+        commit=False,
     )
     expires_at = _parse_expiry(expires)
     return RedemptionCandidate(
@@ -337,20 +380,18 @@ def _make_candidate(
         source=source,
         expires_at=expires_at,
         expired_flag=expired_flag,
-        priority=_ORIGIN_PRIORITY.get(origin, 99),
+        priority=priority,
     )
 
 
 def _determine_matched_games(db_keys: Iterable[Key], source_keys: Iterable[Key]) -> set[str]:
     games: set[str] = set()
-    for key in db_keys:
-        game = _normalize_game(key.game)
-        if game:
-            games.add(game)
-    for key in source_keys:
+    for key in chain(db_keys, source_keys):
         game = _normalize_game(key.game)
-        if game:
+        if game and game not in games:
             games.add(game)
+            if len(games) == len(_SUPPORTED_GAME_SET):
+                break
     return games
 
 
@@ -371,11 +412,15 @@ def _normalize_game(game: Optional[str]) -> Optional[str]:
     return short if short in _SUPPORTED_GAME_SET else None
 
 
-def _expand_platforms(platform: Optional[str], requested: Sequence[str]) -> List[str]:
+def _expand_platforms(
+    platform: Optional[str],
+    requested: Sequence[str],
+    requested_set: frozenset[str],
+) -> Sequence[str]:
     canonical = _canonical_platform(platform)
     if canonical in (None, "manual", "universal"):
-        return list(requested)
-    return [canonical] if canonical in requested else []
+        return requested
+    return (canonical,) if canonical in requested_set else ()
 
 
 def _canonical_platform(platform: Optional[str]) -> Optional[str]:
@@ -396,12 +441,12 @@ def _canonical_platform(platform: Optional[str]) -> Optional[str]:
 
 
 def _normalize_expired_flag(value: object) -> bool:
-    if isinstance(value, bool):
+    if value is False or value is True:
         return value
     if isinstance(value, (int, float)):
         return bool(value)
     if isinstance(value, str):
-        return value.strip().lower() in {"true", "1", "yes", "y"}
+        return value.strip().lower() in _TRUE_FLAG_STRINGS
     return False
 
 
@@ -411,19 +456,34 @@ def _parse_expiry(value: Optional[str]) -> Optional[_dt.datetime]:
     text = value.strip()
     if not text:
         return None
+    return _parse_expiry_text(text)
+
 
-    text = text.replace("Z", "+00:00")
+@lru_cache(maxsize=4096)
+def _parse_expiry_text(text: str) -> Optional[_dt.datetime]:
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
     try:
         dt_obj = _dt.datetime.fromisoformat(text)
-        if dt_obj.tzinfo is None:
-            dt_obj = dt_obj.replace(tzinfo=UTC)
-        else:
-            dt_obj = dt_obj.astimezone(UTC)
-        return dt_obj
     except ValueError:
         pass
+    else:
+        tz = dt_obj.tzinfo
+        if tz is None:
+            return dt_obj.replace(tzinfo=UTC)
+        if tz is UTC or dt_obj.utcoffset() == _ZERO_OFFSET:
+            return dt_obj
+        return dt_obj.astimezone(UTC)
 
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+    preferred = _EXPIRY_FORMATS.get(len(text))
+    if preferred is not None:
+        try:
+            return _dt.datetime.strptime(text, preferred).replace(tzinfo=UTC)
+        except ValueError:
+            pass
+    for fmt in _EXPIRY_FORMATS.values():
+        if fmt == preferred:
+            continue
         try:
             dt_obj = _dt.datetime.strptime(text, fmt)
             return dt_obj.replace(tzinfo=UTC)
@@ -433,45 +493,61 @@ def _parse_expiry(value: Optional[str]) -> Optional[_dt.datetime]:
 
 
 @lru_cache(maxsize=1)
-def _get_shift_dataset() -> Tuple[Key, ...]:
+def _get_shift_index() -> Dict[str, Tuple[Key, ...]]:
     keys_iter = query.parse_shift_orcicorn()
     if keys_iter is None:
-        return ()
-    return tuple(key.copy() for key in keys_iter)
+        return {}
+    index: Dict[str, List[Key]] = {}
+    for key in keys_iter:
+        code = normalize_shift_code(key.code)
+        if code:
+            index.setdefault(code, []).append(key)
+    return {code: tuple(keys) for code, keys in index.items()}
 
 
 def _load_source_matches(normalized_code: str) -> List[Key]:
-    matches: List[Key] = []
-    for key in _get_shift_dataset():
-        candidate = normalize_shift_code(key.code)
-        if candidate and candidate == normalized_code:
-            matches.append(key.copy())
-    return matches
+    return [key.copy() for key in _get_shift_index().get(normalized_code, ())]
+
+
+def reset_caches() -> None:
+    """Drop per-run caches so the next plan build pulls the SHiFT source again."""
+
+    _get_shift_index.cache_clear()
 
 
 __all__ = [
     "RedemptionCandidate",
     "RedemptionPlan",
     "build_redemption_plan",
+    "reset_caches",
     "normalize_shift_code",
     "normalize_requested_platforms",
     "format_status_detail",
+    "failure_label_for_status",
+    "RETRYABLE_FAILURE_LABELS",
 ]
 
 
+def failure_label_for_status(status: Status) -> str:
+    """Map a non-positive Status to the label persisted in failed_keys."""
+
+    label = _FAILURE_LABELS.get(status)
+    if label is None:
+        return getattr(status, "name", "UNKNOWN_ERROR")
+    return label
+
+
 def format_status_detail(status: Status, key: Key) -> str:
     """Render a Status message with key metadata, falling back gracefully."""
 
     detail = getattr(status, "msg", str(status))
 
-    # First try the common {key.reward}/{key.code} placeholders.
-    try:
-        return detail.format(key=key)
-    except Exception:
-        pass
+    # Already-rendered messages have nothing to substitute.
+    if isinstance(detail, str) and "{" not in detail and "}" not in detail:
+        return detail
 
-    # Some dynamically constructed Status objects may store the rendered string.
+    # Fill the common {key.reward}/{key.code} placeholders.
     try:
-        return str(detail.format())  # type: ignore[arg-type]
+        return detail.format(key=key)
     except Exception:
         return str(detail)
@@ -22,6 +22,7 @@
 from __future__ import print_function
 
 import pickle
+from email.utils import parsedate_to_datetime
 from enum import Enum
 from typing import Any, Literal, Optional, Union, cast
 
@@ -56,6 +57,22 @@ def json_headers(token):
     return {"x-csrf-token": token, "x-requested-with": "XMLHttpRequest"}
 
 
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
 # filthy enum hack with auto convert
 class Status(Enum):
     NONE = "Something unexpected happened.."
@@ -86,6 +103,10 @@ class Status(Enum):
             return False
         return self._name_ == other._name_
 
+    # keep members usable as dict keys; must agree with the name-based __eq__
+    def __hash__(self) -> int:
+        return hash(self._name_)
+
     def __call__(self, new_msg: str):
         if "{msg}" in new_msg:
             new_msg = new_msg.format(msg=new_msg)
@@ -96,6 +117,10 @@ class Status(Enum):
         return obj
 
 
+# outcomes that mean the reward is on the account; hash lookup via the name-based __hash__
+POSITIVE_STATUSES = frozenset({Status.SUCCESS, Status.REDEEMED})
+
+
 # windows / unix `getch`
 try:
     import msvcrt
@@ -159,6 +184,8 @@ class ShiftClient:
     def __init__(self, user: str = None, pw: str = None):
         self.client = requests.session()
         self.last_status = Status.NONE
+        # server-suggested wait from the last rate-limited response, if it sent one
+        self.last_retry_after: Optional[float] = None
         # profile-aware cookie path
         self.cookie_file = data_path(".cookies.save")
         # DEV Notes: Ported cookie bootstrap flow from Fabbi (fc1f984...) while keeping requests session
@@ -242,6 +269,7 @@ class ShiftClient:
         return True
 
     def redeem(self, code: str, game: str, platform: str) -> Status:
+        self.last_retry_after = None
         found, status_code, form_data = self.__get_redemption_form(code, game, platform)
         # the expired message comes from even wanting to redeem
         if not found:
@@ -342,6 +370,8 @@ class ShiftClient:
 
         if r.status_code != 200:
             _L.debug(f"Did not return code 200: {r.status_code}")
+            if r.status_code == 429:
+                self.last_retry_after = parse_retry_after(r.headers.get("Retry-After"))
             return False, r.status_code, r.reason
 
         soup = BSoup(r.text, "html.parser")
@@ -446,6 +476,9 @@ class ShiftClient:
         headers = {"Referer": f"{base_url}/rewards"}  # DEV Notes: Ported referer tweak from Fabbi (f957ba5...)
         r = self.client.post(the_url, data=data, headers=headers, allow_redirects=False)
         _L.debug(f"{r.request.method} {r.url} {r.status_code}")
+        if r.status_code == 429:
+            self.last_retry_after = parse_retry_after(r.headers.get("Retry-After"))
+            return Status.SLOWDOWN
         status = self.__check_redemption_status(r)
         # did we visit /code_redemptions/...... route?
         redemption = False